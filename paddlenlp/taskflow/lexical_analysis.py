@@ -13,15 +13,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+import itertools
 import os
+import shutil
+from collections import OrderedDict
 
+import numpy as np
 import paddle
 
-from ..data import Pad, Stack, Tuple
 from ..datasets import load_dataset
+from ..utils.log import logger
 from .models import BiGruCrf
 from .task import Task
-from .utils import Customization
+from .utils import Customization, static_mode_guard
 
 usage = r"""
            from paddlenlp import Taskflow
@@ -39,9 +44,53 @@ usage = r"""
            ]
            '''
 
+           # batch_size为每个批次的token预算，即每批最多包含batch_size条最大长度(512)文本的字符数，
+           # 较短的文本会按长度排序后打包进同一批次，因此一批中的文本数可能多于batch_size
+           lac = Taskflow("lexical_analysis", batch_size=16)
+
+           # 在GPU上使用TensorRT引擎(FP16)加速推理
+           lac = Taskflow("lexical_analysis", use_tensorrt=True)
+
          """
 
 
+# The sample texts of various domains to calibrate the int8 model by post training quantization
+CALIBRATION_TEXTS = [
+    "LAC是个优秀的分词工具",
+    "三亚是一个美丽的城市",
+    "第十四届全运会在西安举办",
+    "近日国家卫健委发布第九版新型冠状病毒肺炎诊疗方案",
+    "平原上的火焰宣布延期上映",
+    "《长津湖》收尾，北美是最大海外票仓",
+    "赛里木湖是新疆海拔最高的高山湖泊",
+    "热梅茶是一道以梅子为主要原料制作的茶饮",
+    "《孤女》是2010年九州出版社出版的小说，作者是余兼羽",
+    "2月8日上午北京冬奥会自由式滑雪女子大跳台决赛中中国选手谷爱凌以188.25分获得金牌",
+    "百度是一家高科技公司",
+    "今天天气怎么样？明天会下雨吗",
+    "北京到上海的高铁票还有吗",
+    "附近有什么好吃的川菜馆",
+    "iPhone 14 Pro的电池续航怎么样",
+    "请问这款笔记本电脑支持Windows 11吗？",
+    "中国人民银行决定于2023年3月27日降低金融机构存款准备金率0.25个百分点",
+    "上证指数今日收盘报3250.55点，上涨0.63%",
+    "据新华社报道，国务院总理主持召开国务院常务会议，部署进一步稳经济的措施",
+    "张三和李四毕业于清华大学计算机系，现在在深圳一家互联网公司工作",
+    "患者主诉头痛、发热三天，体温38.5℃，建议血常规检查",
+    "本合同自双方签字盖章之日起生效，有效期为三年",
+    "鲁迅原名周树人，浙江绍兴人，是中国现代文学的奠基人之一",
+    "床前明月光，疑是地上霜。举头望明月，低头思故乡。",
+    "长江是亚洲第一长河，全长约6300公里，流经青海、西藏、四川等十一个省级行政区",
+    "这家店的服务态度很好，菜品也很新鲜，下次还会再来",
+    "快递三天了还没到，客服也一直联系不上，太失望了",
+    "自然语言处理是人工智能领域的一个重要方向",
+    "飞桨PaddlePaddle是百度开源的深度学习平台",
+    "小明的妈妈让他放学后去超市买两斤鸡蛋和一瓶酱油",
+    "世界卫生组织（WHO）总部位于瑞士日内瓦",
+    "2022年卡塔尔世界杯决赛，阿根廷队通过点球大战击败法国队夺得冠军",
+]
+
+
 def load_vocab(dict_path):
     """
     Load vocab from file
@@ -66,6 +115,65 @@ def load_vocab(dict_path):
     return vocab
 
 
+def _segment_tags_loop(tag_ids, is_begin, is_outside):
+    """
+    Find the start index of each word from the BIO tag ids, a new word starts at the
+    first character, at a `-B` tag and at an `O` tag which follows a non `O` tag.
+    """
+    starts = np.empty(tag_ids.shape[0], dtype=np.int64)
+    num_words = 0
+    for i in range(tag_ids.shape[0]):
+        tag_id = tag_ids[i]
+        if i == 0 or is_begin[tag_id] or (is_outside[tag_id] and not is_outside[tag_ids[i - 1]]):
+            starts[num_words] = i
+            num_words += 1
+    return starts[:num_words]
+
+
+def _segment_tags_vectorized(tag_ids, is_begin, is_outside):
+    """
+    The NumPy version of `_segment_tags_loop`, used when numba is not installed.
+    """
+    is_start = is_begin[tag_ids]
+    is_start[1:] |= is_outside[tag_ids[1:]] & ~is_outside[tag_ids[:-1]]
+    is_start[:1] = True
+    return np.flatnonzero(is_start)
+
+
+def _batchify_fn(samples):
+    """
+    Pad the token ids of the samples into one array allocated for the whole batch.
+    """
+    seq_len = np.array([lens for _, lens in samples], dtype="int64")
+    input_ids = np.zeros((len(samples), seq_len.max()), dtype="int64")
+    for index, (ids, lens) in enumerate(samples):
+        input_ids[index, :lens] = ids
+    return input_ids, seq_len
+
+
+_segment_tags = None
+
+
+def _get_segment_tags():
+    """
+    Get the kernel to segment the tag ids, numba is imported on the first call since it is slow to import.
+    """
+    global _segment_tags
+    if _segment_tags is None:
+        try:
+            from numba import njit
+        except ImportError:
+            _segment_tags = _segment_tags_vectorized
+        else:
+            try:
+                # Cache the compiled kernel on disk to save the compilation of each new process
+                _segment_tags = njit(cache=True)(_segment_tags_loop)
+            except RuntimeError:
+                # No writable cache directory is found, e.g. a read-only installation, compile in each process instead
+                _segment_tags = njit(_segment_tags_loop)
+    return _segment_tags
+
+
 class LacTask(Task):
     """
     Lexical analysis of Chinese task to segement the chinese sentence.
@@ -109,8 +217,14 @@ class LacTask(Task):
         self._user_dict = user_dict
         self._check_task_files()
         self._construct_vocabs()
-        self._get_inference_model()
         self._max_seq_len = 512
+        self._use_tensorrt = self.kwargs["use_tensorrt"] if "use_tensorrt" in self.kwargs else False
+        self._get_inference_model()
+        if self._use_tensorrt and paddle.get_device().split(":", 1)[0] != "gpu":
+            logger.warning("The TensorRT engine is not enabled, `use_tensorrt` only takes effect on gpu.")
+        # The LRU cache of the predicted tag ids of the recently seen texts
+        self._pred_cache = OrderedDict()
+        self._max_cache_size = 1024
         if self._user_dict:
             self._custom = Customization()
             self._custom.load_customization(self._user_dict)
@@ -126,6 +240,134 @@ class LacTask(Task):
             paddle.static.InputSpec(shape=[None], dtype="int64", name="length"),
         ]
 
+    def _prepare_static_mode(self):
+        """
+        Construct the input data and predictor in the PaddlePaddele static mode. When `precision` is
+        `int8` on cpu, the int8 model is generated from the exported model by post training quantization.
+        When `use_tensorrt` is True on gpu, the TensorRT engine is enabled.
+        """
+        if self._infer_precision == "int8" and not self.is_static_model and paddle.get_device() == "cpu":
+            self._quantize_static_model()
+            self._config = paddle.inference.Config(self._static_model_file, self._static_params_file)
+        if self._use_tensorrt and paddle.get_device().split(":", 1)[0] == "gpu":
+            self._enable_tensorrt()
+        super()._prepare_static_mode()
+
+    def _enable_tensorrt(self):
+        """
+        Enable the TensorRT engine in fp16 for the inference on gpu. The dynamic shapes of the TensorRT
+        subgraphs are collected by running the model once. Since the shapes depend on `batch_size`, the shape
+        range and the serialized engines of each `batch_size` are saved in a separate directory.
+        """
+        batch_size = self.kwargs["batch_size"] if "batch_size" in self.kwargs else 1
+        trt_cache_dir = os.path.join(os.path.dirname(self.inference_model_path), "_opt_cache")
+        if self._param_updated:
+            # The serialized engines are keyed by the variable names and the precision instead of the weights,
+            # remove the engines of all the batch sizes so that they are rebuilt with the updated parameters
+            shutil.rmtree(trt_cache_dir, ignore_errors=True)
+        optim_cache_dir = os.path.join(trt_cache_dir, "batch_size_{}".format(batch_size))
+        shape_range_info_path = os.path.join(optim_cache_dir, "shape_range_info.pbtxt")
+        if not os.path.exists(shape_range_info_path):
+            # The engines built for another shape range are stale
+            shutil.rmtree(optim_cache_dir, ignore_errors=True)
+            os.makedirs(optim_cache_dir)
+            self._collect_shape_range_info(shape_range_info_path)
+        # TensorRT engine requires the gpu to be enabled first
+        self._config.enable_use_gpu(100, self.kwargs["device_id"])
+        self._config.enable_tensorrt_engine(
+            workspace_size=1 << 28,
+            # The token budget of a batch allows up to `batch_size * max_seq_len` texts of one character
+            max_batch_size=batch_size * self._max_seq_len,
+            min_subgraph_size=3,
+            precision_mode=paddle.inference.PrecisionType.Half,
+            use_static=True,
+            use_calib_mode=False,
+        )
+        self._config.set_optim_cache_dir(optim_cache_dir)
+        # Allow to rebuild the engine for the shapes out of the collected range, e.g. a batch of many short texts
+        self._config.enable_tuned_tensorrt_dynamic_shape(shape_range_info_path, True)
+        logger.info(">>> [InferBackend] Use TensorRT engine for the inference on gpu ...")
+
+    def _collect_shape_range_info(self, shape_range_info_path):
+        """
+        Run the static model with the smallest and the largest inputs to collect the shape range of each tensor.
+        Since the batches are built by the token budget, the largest batch is either `batch_size` texts of the
+        max sequence length or `batch_size * max_seq_len` texts of one character.
+        """
+        config = paddle.inference.Config(self._static_model_file, self._static_params_file)
+        config.enable_use_gpu(100, self.kwargs["device_id"])
+        config.switch_use_feed_fetch_ops(False)
+        config.disable_glog_info()
+        config.collect_shape_range_info(shape_range_info_path)
+        predictor = paddle.inference.create_predictor(config)
+        input_handles = [predictor.get_input_handle(name) for name in predictor.get_input_names()]
+        batch_size = self.kwargs["batch_size"] if "batch_size" in self.kwargs else 1
+        for num_texts, seq_len in [
+            (1, 1),
+            (batch_size, 32),
+            (batch_size, self._max_seq_len),
+            (batch_size * self._max_seq_len, 1),
+        ]:
+            input_handles[0].copy_from_cpu(np.ones((num_texts, seq_len), dtype="int64"))
+            input_handles[1].copy_from_cpu(np.full(num_texts, seq_len, dtype="int64"))
+            predictor.run()
+
+    def _quantize_static_model(self):
+        """
+        Quantize the exported static model to int8 by post training quantization. The model is calibrated
+        on the texts of `calibration_texts` in the kwargs, which default to `CALIBRATION_TEXTS`.
+        """
+        calibration_texts = (
+            self.kwargs["calibration_texts"] if "calibration_texts" in self.kwargs else CALIBRATION_TEXTS
+        )
+        calibration_texts = [text[: self._max_seq_len] for text in calibration_texts if len(text.strip()) > 0]
+        if len(calibration_texts) == 0:
+            raise ValueError("The calibration texts for the int8 quantization should not be empty.")
+        int8_model_path = self.inference_model_path + "-int8"
+        if calibration_texts != CALIBRATION_TEXTS:
+            # Save the model calibrated on the user texts apart, so that it is rebuilt when the texts change
+            int8_model_path += "-" + hashlib.md5("\n".join(calibration_texts).encode("utf-8")).hexdigest()[:8]
+        if not os.path.exists(int8_model_path + ".pdiparams") or self._param_updated:
+            from paddle.static.quantization import PostTrainingQuantization
+
+            logger.info("Converting to the int8 inference model cost a little time.")
+            with static_mode_guard():
+                exe = paddle.static.Executor(paddle.CPUPlace())
+                # The feed names follow the input spec of the exported model
+                feed_list = [
+                    paddle.static.data(name="token_ids", shape=[None, None], dtype="int64"),
+                    paddle.static.data(name="length", shape=[None], dtype="int64"),
+                ]
+                data_loader = paddle.io.DataLoader(
+                    [(self._convert_text_to_ids(text), len(text)) for text in calibration_texts],
+                    feed_list=feed_list,
+                    places=paddle.CPUPlace(),
+                    return_list=False,
+                    batch_size=16,
+                    collate_fn=_batchify_fn,
+                )
+                post_training_quantization = PostTrainingQuantization(
+                    executor=exe,
+                    data_loader=data_loader,
+                    model_dir=os.path.dirname(self.inference_model_path),
+                    model_filename=os.path.basename(self._static_model_file),
+                    params_filename=os.path.basename(self._static_params_file),
+                    algo="abs_max",
+                    quantizable_op_type=["matmul", "matmul_v2", "mul"],
+                    is_full_quantize=False,
+                    weight_bits=8,
+                    activation_bits=8,
+                )
+                post_training_quantization.quantize()
+                post_training_quantization.save_quantized_model(
+                    save_model_path=os.path.dirname(int8_model_path),
+                    model_filename=os.path.basename(int8_model_path) + ".pdmodel",
+                    params_filename=os.path.basename(int8_model_path) + ".pdiparams",
+                )
+            logger.info("The int8 inference model save in the path:{}".format(int8_model_path))
+        self._static_model_file = int8_model_path + ".pdmodel"
+        self._static_params_file = int8_model_path + ".pdiparams"
+
     def _construct_vocabs(self):
         word_dict_path = os.path.join(self._task_path, "word.dic")
         tag_dict_path = os.path.join(self._task_path, "tag.dic")
@@ -135,6 +377,48 @@ class LacTask(Task):
         self._q2b_vocab = load_vocab(q2b_dict_path)
         self._id2word_dict = dict(zip(self._word_vocab.values(), self._word_vocab.keys()))
         self._id2tag_dict = dict(zip(self._tag_vocab.values(), self._tag_vocab.keys()))
+        self._construct_word_lut()
+        # Precompute the tag prefix and BIO category of each tag, which are used in the postprocess
+        self._tag_prefix = {tag: tag.split("-")[0] for tag in self._tag_vocab}
+        num_tags = max(int(index) for index in self._id2tag_dict) + 1
+        self._id2tag_arr = np.full(num_tags, "", dtype=object)
+        self._id2tag_prefix = np.full(num_tags, "", dtype=object)
+        self._tag_is_begin = np.zeros(num_tags, dtype=bool)
+        self._tag_is_outside = np.zeros(num_tags, dtype=bool)
+        for index, tag in self._id2tag_dict.items():
+            self._id2tag_arr[int(index)] = tag
+            self._id2tag_prefix[int(index)] = self._tag_prefix[tag]
+            self._tag_is_begin[int(index)] = tag.endswith("-B")
+            self._tag_is_outside[int(index)] = tag == "O"
+
+    def _construct_word_lut(self):
+        """
+        Construct the lookup tables from the character to the word id, the q2b conversion
+        is folded into the tables so that a sentence can be converted to ids in one shot.
+        """
+        self._oov_token_id = int(self._word_vocab.get("OOV"))
+        self._fused_vocab = {}
+        for token in itertools.chain(self._word_vocab, self._q2b_vocab):
+            self._fused_vocab[token] = int(self._word_vocab.get(self._q2b_vocab.get(token, token), self._oov_token_id))
+        # The code points beyond the basic multilingual plane are rare, they are looked up in `_fused_vocab`
+        self._word_lut = np.full(0x10000, self._oov_token_id, dtype="int64")
+        for token, token_id in self._fused_vocab.items():
+            if len(token) == 1 and ord(token) < 0x10000:
+                self._word_lut[ord(token)] = token_id
+        self._ascii_lut = self._word_lut[:128].copy()
+
+    def _convert_text_to_ids(self, text):
+        """
+        Convert the characters of the text to the word ids by the lookup tables.
+        """
+        if text.isascii():
+            # The ascii text is encoded to one byte per character, which is cheaper to encode and look up
+            return self._ascii_lut[np.frombuffer(text.encode("ascii"), dtype=np.uint8)]
+        code_points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+        ids = self._word_lut[np.minimum(code_points, 0xFFFF)]
+        for index in np.flatnonzero(code_points > 0xFFFF):
+            ids[index] = self._fused_vocab.get(text[index], self._oov_token_id)
+        return ids
 
     def _construct_model(self, model):
         """
@@ -166,7 +450,6 @@ class LacTask(Task):
         batch_size = self.kwargs["batch_size"] if "batch_size" in self.kwargs else 1
         num_workers = self.kwargs["num_workers"] if "num_workers" in self.kwargs else 0
         self._split_sentence = self.kwargs["split_sentence"] if "split_sentence" in self.kwargs else False
-        oov_token_id = self._word_vocab.get("OOV")
 
         filter_inputs = []
         for input in inputs:
@@ -180,32 +463,75 @@ class LacTask(Task):
 
         def read(inputs):
             for input_tokens in inputs:
-                ids = []
-                for token in input_tokens:
-                    token = self._q2b_vocab.get(token, token)
-                    token_id = self._word_vocab.get(token, oov_token_id)
-                    ids.append(token_id)
+                ids = self._convert_text_to_ids(input_tokens)
                 lens = len(ids)
                 yield ids, lens
 
-        infer_ds = load_dataset(read, inputs=short_input_texts, lazy=False)
-        batchify_fn = lambda samples, fn=Tuple(
-            Pad(axis=0, pad_val=0, dtype="int64"),  # input_ids
-            Stack(dtype="int64"),  # seq_len
-        ): fn(samples)
-        infer_data_loader = paddle.io.DataLoader(
-            infer_ds,
-            collate_fn=batchify_fn,
-            num_workers=num_workers,
-            batch_size=batch_size,
-            shuffle=False,
-            return_list=True,
-        )
+        # Reuse the cached predictions, only the texts not seen recently are fed to the model
+        cached_preds = {}
+        for text in short_input_texts:
+            if text in self._pred_cache:
+                self._pred_cache.move_to_end(text)
+                cached_preds[text] = self._pred_cache[text]
+        uncached_texts = [text for text in dict.fromkeys(short_input_texts) if text not in cached_preds]
+
+        # Sort the texts by length so that the texts in a batch have similar lengths and little padding,
+        # the results will be restored to the input order after running the model
+        sorted_texts = sorted(uncached_texts, key=len)
+        infer_ds = load_dataset(read, inputs=sorted_texts, lazy=False)
+
+        batch_sampler = self._build_batch_sampler([len(text) for text in sorted_texts], batch_size)
+        if len(batch_sampler) == 0:
+            # All the texts hit the cache
+            infer_data_loader = []
+        elif num_workers == 0 and len(batch_sampler) == 1:
+            # The overhead of the DataLoader dwarfs the inference of a single batch, e.g. a single short text
+            infer_data_loader = [_batchify_fn([infer_ds[index] for index in batch_sampler[0]])]
+        else:
+            infer_data_loader = paddle.io.DataLoader(
+                infer_ds,
+                collate_fn=_batchify_fn,
+                num_workers=num_workers,
+                batch_sampler=batch_sampler,
+                return_list=True,
+                # The batches are fed to the predictor from numpy, keep them on cpu to avoid the device round trip
+                places=paddle.CPUPlace(),
+                # Assemble the batches in the background while the predictor is running
+                use_buffer_reader=True,
+                prefetch_factor=4,
+                use_shared_memory=True,
+            )
         outputs = {}
         outputs["text"] = short_input_texts
+        outputs["sorted_text"] = sorted_texts
+        outputs["cached_preds"] = cached_preds
         outputs["data_loader"] = infer_data_loader
         return outputs
 
+    def _build_batch_sampler(self, lengths, batch_size):
+        """
+        Group the samples sorted by length into batches. Instead of a fixed number of samples, each batch
+        takes as many short samples as fit in the token budget of `batch_size` samples of the max sequence
+        length, so the short texts are packed into fewer and fuller batches.
+        Args:
+            lengths (List[int]): The lengths of the samples in ascending order.
+            batch_size (int): The batch size for the samples of the max sequence length.
+        return:
+            batch_sampler (List[List[int]]): The sample indices of each batch.
+        """
+        max_num_tokens = batch_size * self._max_seq_len
+        batch_sampler = []
+        batch = []
+        for index, length in enumerate(lengths):
+            # The current sample is the longest one in the batch since the lengths are in ascending order
+            if len(batch) > 0 and (len(batch) + 1) * max(length, 1) > max_num_tokens:
+                batch_sampler.append(batch)
+                batch = []
+            batch.append(index)
+        if len(batch) > 0:
+            batch_sampler.append(batch)
+        return batch_sampler
+
     def _run_model(self, inputs):
         """
         Run the task model from the outputs of the `_tokenize` function.
@@ -214,17 +540,71 @@ class LacTask(Task):
         lens = []
         for batch in inputs["data_loader"]:
             input_ids, seq_len = batch
-            self.input_handles[0].copy_from_cpu(input_ids.numpy())
-            self.input_handles[1].copy_from_cpu(seq_len.numpy())
+            if isinstance(input_ids, paddle.Tensor):
+                input_ids, seq_len = input_ids.numpy(), seq_len.numpy()
+            self.input_handles[0].copy_from_cpu(input_ids)
+            self.input_handles[1].copy_from_cpu(seq_len)
             self.predictor.run()
             tags_ids = self.output_handle[0].copy_to_cpu()
-            results.extend(tags_ids.tolist())
-            lens.extend(seq_len.tolist())
+            # Keep the rows of tag ids and the lengths as ndarray, they are only used to index with numpy
+            results.extend(tags_ids)
+            lens.extend(seq_len)
+
+        preds = inputs["cached_preds"]
+        for text, tag_ids, length in zip(inputs["sorted_text"], results, lens):
+            # Copy the row out of the batch array so that the cache does not hold the whole batch
+            preds[text] = tag_ids[:length].copy()
+            self._pred_cache[text] = preds[text]
+            if len(self._pred_cache) > self._max_cache_size:
+                self._pred_cache.popitem(last=False)
 
-        inputs["result"] = results
-        inputs["lens"] = lens
+        # Restore the results to the input order
+        inputs["result"] = [preds[text] for text in inputs["text"]]
+        inputs["lens"] = [len(pred) for pred in inputs["result"]]
         return inputs
 
+    def _decode_tags(self, sent, tag_ids):
+        """
+        Merge the characters of the sentence to words according to the predicted BIO tag ids.
+        Args:
+            sent (str): The input sentence.
+            tag_ids (List[int] | np.ndarray): The predicted tag ids of the characters in the sentence.
+        return:
+            sent_out (List[str]): The words of the sentence.
+            tags_out (List[str]): The tags of the words.
+        """
+        tag_ids = np.asarray(tag_ids, dtype="int64")
+        if self._custom:
+            tags = self._id2tag_arr[tag_ids].tolist()
+            self._custom.parse_customization(sent, tags)
+            starts = []
+            tags_out = []
+            for ind, tag in enumerate(tags):
+                if ind == 0 or tag.endswith("-B") or (tag == "O" and tags[ind - 1] != "O"):
+                    starts.append(ind)
+                    # The tags from the user dict may be out of the tag vocab
+                    tags_out.append(self._tag_prefix.get(tag) or tag.split("-")[0])
+        else:
+            starts = _get_segment_tags()(tag_ids, self._tag_is_begin, self._tag_is_outside)
+            tags_out = self._id2tag_prefix[tag_ids[starts]].tolist()
+            starts = starts.tolist()
+        # Slice each word out of the sentence once instead of concatenating it character by character
+        ends = starts[1:] + [len(tag_ids)]
+        sent_out = [sent[start:end] for start, end in zip(starts, ends)]
+        return sent_out, tags_out
+
+    def _decode_batch_tags(self, sents, preds, lengths):
+        """
+        Decode the tags of a batch of sentences by `_decode_tags`.
+        Args:
+            sents (List[str]): The input sentences.
+            preds (List[np.ndarray]): The predicted tag ids of the sentences.
+            lengths (List[int]): The lengths of the sentences.
+        return:
+            decoded_tags (List[Tuple[List[str], List[str]]]): The words and the tags of the words of each sentence.
+        """
+        return [self._decode_tags(sent, pred[:length]) for sent, pred, length in zip(sents, preds, lengths)]
+
     def _postprocess(self, inputs):
         """
         The model output is the tag ids, this function will convert the model output to raw text.
@@ -233,30 +613,8 @@ class LacTask(Task):
         preds = inputs["result"]
         sents = inputs["text"]
         final_results = []
-        for sent_index in range(len(lengths)):
+        for sent, (sent_out, tags_out) in zip(sents, self._decode_batch_tags(sents, preds, lengths)):
             single_result = {}
-            tags = [self._id2tag_dict[str(index)] for index in preds[sent_index][: lengths[sent_index]]]
-            sent = sents[sent_index]
-            if self._custom:
-                self._custom.parse_customization(sent, tags)
-            sent_out = []
-            tags_out = []
-            parital_word = ""
-            for ind, tag in enumerate(tags):
-                if parital_word == "":
-                    parital_word = sent[ind]
-                    tags_out.append(tag.split("-")[0])
-                    continue
-                if tag.endswith("-B") or (tag == "O" and tags[ind - 1] != "O"):
-                    sent_out.append(parital_word)
-                    tags_out.append(tag.split("-")[0])
-                    parital_word = sent[ind]
-                    continue
-                parital_word += sent[ind]
-
-            if len(sent_out) < len(tags_out):
-                sent_out.append(parital_word)
-
             single_result["text"] = sent
             single_result["segs"] = sent_out
             single_result["tags"] = tags_out
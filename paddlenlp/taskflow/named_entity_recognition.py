@@ -206,29 +206,7 @@ class NERLACTask(LacTask):
         preds = inputs["result"]
         sents = inputs["text"]
         final_results = []
-        for sent_index in range(len(lengths)):
-            tags = [self._id2tag_dict[str(index)] for index in preds[sent_index][: lengths[sent_index]]]
-            sent = sents[sent_index]
-            if self._custom:
-                self._custom.parse_customization(sent, tags)
-            sent_out = []
-            tags_out = []
-            parital_word = ""
-            for ind, tag in enumerate(tags):
-                if parital_word == "":
-                    parital_word = sent[ind]
-                    tags_out.append(tag.split("-")[0])
-                    continue
-                if tag.endswith("-B") or (tag == "O" and tags[ind - 1] != "O"):
-                    sent_out.append(parital_word)
-                    tags_out.append(tag.split("-")[0])
-                    parital_word = sent[ind]
-                    continue
-                parital_word += sent[ind]
-
-            if len(sent_out) < len(tags_out):
-                sent_out.append(parital_word)
-
+        for sent_out, tags_out in self._decode_batch_tags(sents, preds, lengths):
             result = []
             for s, t in zip(sent_out, tags_out):
                 if self.entity_only and t in POS_LABEL_LAC:
@@ -120,28 +120,7 @@ class SegLACTask(LacTask):
         preds = inputs["result"]
         sents = inputs["text"]
         final_results = []
-        for sent_index in range(len(lengths)):
-            tags = [self._id2tag_dict[str(index)] for index in preds[sent_index][: lengths[sent_index]]]
-            sent = sents[sent_index]
-            if self._custom:
-                self._custom.parse_customization(sent, tags)
-            sent_out = []
-            tags_out = []
-            parital_word = ""
-            for ind, tag in enumerate(tags):
-                if parital_word == "":
-                    parital_word = sent[ind]
-                    tags_out.append(tag.split("-")[0])
-                    continue
-                if tag.endswith("-B") or (tag == "O" and tags[ind - 1] != "O"):
-                    sent_out.append(parital_word)
-                    tags_out.append(tag.split("-")[0])
-                    parital_word = sent[ind]
-                    continue
-                parital_word += sent[ind]
-
-            if len(sent_out) < len(tags_out):
-                sent_out.append(parital_word)
+        for sent_out, tags_out in self._decode_batch_tags(sents, preds, lengths):
             final_results.append(sent_out)
         final_results = self._auto_joiner(final_results, self.input_mapping)
         final_results = final_results if len(final_results) > 1 else final_results[0]
@@ -0,0 +1,451 @@
+# Copyright (c) 2023 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import importlib
+import os
+import unittest
+from collections import OrderedDict
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import numpy as np
+import paddle
+
+from paddlenlp.taskflow import lexical_analysis
+from paddlenlp.taskflow.lexical_analysis import (
+    CALIBRATION_TEXTS,
+    LacTask,
+    _get_segment_tags,
+    _segment_tags_loop,
+    _segment_tags_vectorized,
+)
+from paddlenlp.taskflow.models import BiGruCrf
+from paddlenlp.taskflow.utils import Customization, static_mode_guard
+
+TAGS = ["a-B", "a-I", "n-B", "n-I", "v-B", "v-I", "LOC-B", "LOC-I", "w-B", "w-I", "O"]
+CHARS = ["天", "安", "门", "长", "江", "大", "桥", "我", "爱", "北", "京", "，", "A", "b"]
+USER_DICT = ["天安门/LOC", "长江 大桥", "北京/LOC 大桥"]
+
+
+def merge_tags(sent, tags):
+    """
+    The merge loop of the BIO tags to words before the LAC postprocess was vectorized.
+    """
+    sent_out = []
+    tags_out = []
+    parital_word = ""
+    for ind, tag in enumerate(tags):
+        if parital_word == "":
+            parital_word = sent[ind]
+            tags_out.append(tag.split("-")[0])
+            continue
+        if tag.endswith("-B") or (tag == "O" and tags[ind - 1] != "O"):
+            sent_out.append(parital_word)
+            tags_out.append(tag.split("-")[0])
+            parital_word = sent[ind]
+            continue
+        parital_word += sent[ind]
+    if len(sent_out) < len(tags_out):
+        sent_out.append(parital_word)
+    return sent_out, tags_out
+
+
+def write_vocab_files(task_path):
+    with open(os.path.join(task_path, "tag.dic"), "w", encoding="utf8") as f:
+        f.writelines("{}\t{}\n".format(index, tag) for index, tag in enumerate(TAGS))
+    with open(os.path.join(task_path, "word.dic"), "w", encoding="utf8") as f:
+        f.writelines("{}\t{}\n".format(index, word) for index, word in enumerate(CHARS + ["OOV"]))
+    with open(os.path.join(task_path, "q2b.dic"), "w", encoding="utf8") as f:
+        f.write("Ａ\tA\n")
+
+
+def build_lac_task(task_path):
+    """
+    Build the LAC task from the vocab files only, without loading the model.
+    """
+    write_vocab_files(task_path)
+    task = object.__new__(LacTask)
+    task._task_path = task_path
+    task._construct_vocabs()
+    task._custom = None
+    return task
+
+
+def save_tiny_model(task_path):
+    """
+    Save the vocab files and the parameters of a tiny random LAC model.
+    """
+    write_vocab_files(task_path)
+    paddle.seed(0)
+    model = BiGruCrf(8, 8, len(CHARS) + 1, len(TAGS))
+    # Keep the random model from predicting the start and stop tags of the crf
+    bias = model.fc.bias.numpy()
+    bias[len(TAGS) :] = -1e4
+    model.fc.bias.set_value(bias)
+    paddle.save(model.state_dict(), os.path.join(task_path, "model_state.pdparams"))
+
+
+def check_lac_results(test_case, task, texts):
+    outputs = task._run_model(task._preprocess((texts,)))
+    for text, pred in zip(texts, outputs["result"]):
+        test_case.assertEqual(pred.shape, (len(text),))
+        test_case.assertTrue(((pred >= 0) & (pred < len(TAGS))).all())
+    for text, result in zip(texts, task(texts)):
+        test_case.assertEqual("".join(result["segs"]), text)
+        test_case.assertEqual(len(result["segs"]), len(result["tags"]))
+
+
+class TestLacDecode(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = TemporaryDirectory()
+        cls.task = build_lac_task(cls.temp_dir.name)
+        cls.user_dict_path = os.path.join(cls.temp_dir.name, "user_dict.txt")
+        with open(cls.user_dict_path, "w", encoding="utf8") as f:
+            f.write("\n".join(USER_DICT))
+        cls.rng = np.random.RandomState(seed=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def random_samples(self, num_samples=200):
+        samples = []
+        outside_id = TAGS.index("O")
+        # Cover the single character sentence and the sentences of only `O` tags
+        for seq_len in [1, 1, 2, 5]:
+            samples.append((self.rng.choice(CHARS, seq_len), np.full(seq_len, outside_id)))
+        samples.append((self.rng.choice(CHARS, 1), self.rng.randint(0, len(TAGS), 1)))
+        for _ in range(num_samples):
+            seq_len = self.rng.randint(1, 40)
+            # Draw many `O` tags to produce the runs of `O`
+            probs = np.full(len(TAGS), 0.5 / (len(TAGS) - 1))
+            probs[outside_id] = 0.5
+            samples.append((self.rng.choice(CHARS, seq_len), self.rng.choice(len(TAGS), seq_len, p=probs)))
+        return [("".join(chars), tag_ids.astype("int64")) for chars, tag_ids in samples]
+
+    def test_segment_tags(self):
+        for sent, tag_ids in self.random_samples():
+            sent_out, _ = merge_tags(sent, [TAGS[index] for index in tag_ids])
+            expected_starts = np.cumsum([0] + [len(word) for word in sent_out[:-1]])
+            for segment_tags in [_segment_tags_loop, _segment_tags_vectorized, _get_segment_tags()]:
+                starts = segment_tags(tag_ids, self.task._tag_is_begin, self.task._tag_is_outside)
+                self.assertListEqual(starts.tolist(), expected_starts.tolist())
+
+    @unittest.skipIf(importlib.util.find_spec("numba") is None, "numba is not installed")
+    def test_segment_tags_without_cache_dir(self):
+        caching = importlib.import_module("numba.core.caching")
+        cache_impl = caching.CacheImpl if hasattr(caching, "CacheImpl") else caching._CacheImpl
+        # No locator is available when neither the package nor the user cache directory is writable
+        with mock.patch.object(cache_impl, "_locator_classes", []), mock.patch.object(
+            lexical_analysis, "_segment_tags", None
+        ):
+            segment_tags = _get_segment_tags()
+        for sent, tag_ids in self.random_samples(20):
+            expected = segment_tags(tag_ids, self.task._tag_is_begin, self.task._tag_is_outside)
+            starts = _segment_tags_vectorized(tag_ids, self.task._tag_is_begin, self.task._tag_is_outside)
+            self.assertListEqual(starts.tolist(), expected.tolist())
+
+    def test_decode_tags(self):
+        for sent, tag_ids in self.random_samples():
+            expected = merge_tags(sent, [TAGS[index] for index in tag_ids])
+            self.assertEqual(self.task._decode_tags(sent, tag_ids), expected)
+            self.assertEqual(self.task._decode_tags(sent, tag_ids.tolist()), expected)
+
+    def test_decode_tags_with_user_dict(self):
+        custom = Customization()
+        custom.load_customization(self.user_dict_path)
+        self.task._custom = custom
+        try:
+            phrases = ["天安门", "长江大桥", "北京大桥"]
+            for sent, tag_ids in self.random_samples():
+                # Insert a phrase of the user dict to trigger the customization
+                phrase = phrases[self.rng.randint(len(phrases))]
+                start = self.rng.randint(len(sent) + 1)
+                sent = sent[:start] + phrase + sent[start:]
+                tag_ids = np.concatenate(
+                    [tag_ids[:start], self.rng.randint(0, len(TAGS), len(phrase)), tag_ids[start:]]
+                )
+                tags = [TAGS[index] for index in tag_ids]
+                custom.parse_customization(sent, tags)
+                self.assertEqual(self.task._decode_tags(sent, tag_ids), merge_tags(sent, tags))
+        finally:
+            self.task._custom = None
+
+
+class TestLacBatchSampler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.task = object.__new__(LacTask)
+        cls.task._max_seq_len = 8
+
+    def check_batch_sampler(self, lengths, batch_size):
+        batch_sampler = self.task._build_batch_sampler(lengths, batch_size)
+        # The batches keep the order of the samples sorted by length
+        self.assertListEqual(sum(batch_sampler, []), list(range(len(lengths))))
+        for batch in batch_sampler:
+            self.assertGreater(len(batch), 0)
+            if len(batch) > 1:
+                max_length = max(max(lengths[index] for index in batch), 1)
+                self.assertLessEqual(len(batch) * max_length, batch_size * self.task._max_seq_len)
+        return batch_sampler
+
+    def test_token_budget(self):
+        self.assertListEqual(self.check_batch_sampler([], 1), [])
+        self.assertListEqual(self.check_batch_sampler([1] * 10, 1), [list(range(8)), [8, 9]])
+        self.assertListEqual(self.check_batch_sampler([2, 2, 3, 3, 5, 8], 2), [[0, 1, 2, 3], [4, 5]])
+        self.assertListEqual(self.check_batch_sampler([4, 4, 8, 8], 1), [[0, 1], [2], [3]])
+        rng = np.random.RandomState(seed=0)
+        for _ in range(100):
+            lengths = sorted(rng.randint(0, self.task._max_seq_len + 1, rng.randint(1, 50)).tolist())
+            self.check_batch_sampler(lengths, rng.randint(1, 5))
+
+    def test_over_long_sample(self):
+        # A sample longer than the token budget is put into a batch of its own
+        batch_sampler = self.check_batch_sampler([1, 1, 3, 20, 30], 1)
+        self.assertListEqual(batch_sampler, [[0, 1], [2], [3], [4]])
+
+
+class StubHandle:
+    def copy_from_cpu(self, data):
+        self.data = data
+
+    def copy_to_cpu(self):
+        return self.data
+
+
+class StubPredictor:
+    """
+    The predictor which tags each character by its token id and counts the texts fed to it.
+    """
+
+    def __init__(self, input_handles, output_handle):
+        self.input_handles = input_handles
+        self.output_handle = output_handle
+        self.num_texts = 0
+
+    def run(self):
+        token_ids = self.input_handles[0].data
+        self.num_texts += len(token_ids)
+        self.output_handle.data = token_ids % len(TAGS)
+
+
+class TestLacPredictionCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = TemporaryDirectory()
+        cls.task = build_lac_task(cls.temp_dir.name)
+        cls.task.kwargs = {"batch_size": 8}
+        cls.task._max_seq_len = 512
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def setUp(self):
+        self.task._pred_cache = OrderedDict()
+        self.task._max_cache_size = 1024
+        self.task.input_handles = [StubHandle(), StubHandle()]
+        self.task.output_handle = [StubHandle()]
+        self.task.predictor = StubPredictor(self.task.input_handles, self.task.output_handle[0])
+
+    def check_predict(self, texts, num_fed_texts):
+        num_texts = self.task.predictor.num_texts
+        outputs = self.task._run_model(self.task._preprocess((texts,)))
+        self.assertEqual(self.task.predictor.num_texts - num_texts, num_fed_texts)
+        # The results are restored to the input order
+        self.assertEqual(len(outputs["result"]), len(texts))
+        for text, pred, length in zip(texts, outputs["result"], outputs["lens"]):
+            self.assertEqual(length, len(text))
+            self.assertListEqual(pred.tolist(), (self.task._convert_text_to_ids(text) % len(TAGS)).tolist())
+
+    def test_duplicate_texts(self):
+        texts = ["我爱北京", "天安门", "我爱北京", "长江大桥", "天安门", "我爱北京"]
+        self.check_predict(texts, 3)
+        self.assertListEqual(list(self.task._pred_cache), ["天安门", "我爱北京", "长江大桥"])
+
+    def test_partial_cache_hit(self):
+        self.check_predict(["我爱北京", "天安门"], 2)
+        self.check_predict(["长江", "天安门", "大桥", "我爱北京", "长江"], 2)
+        self.check_predict(["天安门", "长江", "我爱北京", "大桥"], 0)
+
+    def test_cache_eviction(self):
+        self.task._max_cache_size = 2
+        self.check_predict(["长江大桥", "天安门", "我爱北京"], 3)
+        # The least recently used texts are evicted first
+        self.assertEqual(len(self.task._pred_cache), 2)
+        self.assertNotIn("天安门", self.task._pred_cache)
+        self.check_predict(["长江大桥"], 0)
+        self.check_predict(["天安门"], 1)
+        self.assertListEqual(list(self.task._pred_cache), ["长江大桥", "天安门"])
+        self.check_predict(["我爱北京", "长江大桥", "天安门"], 1)
+        self.assertListEqual(list(self.task._pred_cache), ["天安门", "我爱北京"])
+
+
+class TestLacInt8Quantization(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = TemporaryDirectory()
+        cls.task_path = cls.temp_dir.name
+        save_tiny_model(cls.task_path)
+        cls.device = paddle.get_device()
+        # The int8 model is generated and run on cpu only
+        paddle.set_device("cpu")
+
+    @classmethod
+    def tearDownClass(cls):
+        paddle.set_device(cls.device)
+        cls.temp_dir.cleanup()
+
+    def build_int8_task(self, **kwargs):
+        return LacTask(
+            task="lexical_analysis",
+            model="lac",
+            task_path=self.task_path,
+            emb_dim=8,
+            hidden_size=8,
+            precision="int8",
+            device_id=-1,
+            **kwargs,
+        )
+
+    def test_calibration_data_loader(self):
+        task = build_lac_task(self.task_path)
+        task.kwargs = {"calibration_texts": ["天安门", " ", "我爱北京天安门，长江大桥"]}
+        task._max_seq_len = 512
+        task._param_updated = False
+        task.inference_model_path = os.path.join(self.task_path, "mock", "inference")
+        task._static_model_file = task.inference_model_path + ".pdmodel"
+        task._static_params_file = task.inference_model_path + ".pdiparams"
+        with mock.patch("paddle.static.quantization.PostTrainingQuantization") as post_training_quantization:
+            task._quantize_static_model()
+        kwargs = post_training_quantization.call_args[1]
+        self.assertEqual(kwargs["model_dir"], os.path.join(self.task_path, "mock"))
+        self.assertEqual(kwargs["model_filename"], "inference.pdmodel")
+        self.assertEqual(kwargs["params_filename"], "inference.pdiparams")
+        # The blank texts are skipped, the others are padded into one batch fed by the input names
+        with static_mode_guard():
+            batches = list(kwargs["data_loader"]())
+        self.assertEqual(len(batches), 1)
+        feed = batches[0][0] if isinstance(batches[0], list) else batches[0]
+        token_ids, seq_len = np.array(feed["token_ids"]), np.array(feed["length"])
+        self.assertListEqual(seq_len.tolist(), [3, 12])
+        self.assertListEqual(token_ids[0].tolist(), task._convert_text_to_ids("天安门").tolist() + [0] * 9)
+        self.assertListEqual(token_ids[1].tolist(), task._convert_text_to_ids("我爱北京天安门，长江大桥").tolist())
+        # The model calibrated on the user texts is saved apart from the default one
+        self.assertRegex(task._static_model_file, r"inference-int8-[0-9a-f]{8}\.pdmodel$")
+
+    def test_int8_inference(self):
+        task = self.build_int8_task()
+        self.assertEqual(task._static_model_file, task.inference_model_path + "-int8.pdmodel")
+        self.assertTrue(os.path.exists(task._static_model_file))
+        self.assertTrue(os.path.exists(task._static_params_file))
+        check_lac_results(self, task, ["天安门", "我爱北京天安门，长江大桥", "A"])
+
+    def test_calibration_texts(self):
+        task = self.build_int8_task(calibration_texts=CALIBRATION_TEXTS[:4])
+        self.assertRegex(task._static_model_file, r"inference-int8-[0-9a-f]{8}\.pdmodel$")
+        self.assertTrue(os.path.exists(task._static_params_file))
+        with self.assertRaises(ValueError):
+            self.build_int8_task(calibration_texts=["", " "])
+
+
+class TestLacTensorRT(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = TemporaryDirectory()
+        cls.task_path = cls.temp_dir.name
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def enable_tensorrt(self, batch_size, param_updated=False):
+        task = build_lac_task(self.task_path)
+        task.kwargs = {"batch_size": batch_size, "device_id": 0}
+        task._max_seq_len = 512
+        task._param_updated = param_updated
+        task.inference_model_path = os.path.join(self.task_path, "static", "inference")
+        task._config = mock.MagicMock()
+
+        def collect_shape_range_info(shape_range_info_path):
+            with open(shape_range_info_path, "w") as f:
+                f.write(str(batch_size))
+
+        with mock.patch.object(task, "_collect_shape_range_info", side_effect=collect_shape_range_info) as collect:
+            task._enable_tensorrt()
+        return task._config, collect
+
+    def test_cache_by_batch_size(self):
+        trt_cache_dir = os.path.join(self.task_path, "static", "_opt_cache")
+        config, collect = self.enable_tensorrt(batch_size=1)
+        optim_cache_dir = os.path.join(trt_cache_dir, "batch_size_1")
+        shape_range_info_path = os.path.join(optim_cache_dir, "shape_range_info.pbtxt")
+        collect.assert_called_once_with(shape_range_info_path)
+        config.set_optim_cache_dir.assert_called_once_with(optim_cache_dir)
+        config.enable_tuned_tensorrt_dynamic_shape.assert_called_once_with(shape_range_info_path, True)
+        self.assertEqual(config.enable_tensorrt_engine.call_args[1]["max_batch_size"], 512)
+        # Mock a serialized engine
+        open(os.path.join(optim_cache_dir, "engine"), "w").close()
+
+        # A new batch size collects its own shape range, and keeps the engines of the other batch sizes
+        config, collect = self.enable_tensorrt(batch_size=4)
+        collect.assert_called_once_with(os.path.join(trt_cache_dir, "batch_size_4", "shape_range_info.pbtxt"))
+        self.assertEqual(config.enable_tensorrt_engine.call_args[1]["max_batch_size"], 4 * 512)
+        self.assertTrue(os.path.exists(os.path.join(optim_cache_dir, "engine")))
+
+        # The shape range and the engines are reused for the same batch size
+        config, collect = self.enable_tensorrt(batch_size=1)
+        collect.assert_not_called()
+        self.assertTrue(os.path.exists(os.path.join(optim_cache_dir, "engine")))
+
+        # The engines of all the batch sizes are removed when the parameters are updated
+        config, collect = self.enable_tensorrt(batch_size=1, param_updated=True)
+        collect.assert_called_once_with(shape_range_info_path)
+        self.assertFalse(os.path.exists(os.path.join(optim_cache_dir, "engine")))
+        self.assertFalse(os.path.exists(os.path.join(trt_cache_dir, "batch_size_4")))
+
+    @unittest.skipIf(
+        not paddle.is_compiled_with_cuda() or paddle.inference.get_trt_compile_version() == (0, 0, 0),
+        "paddle is not compiled with TensorRT",
+    )
+    def test_tensorrt_inference(self):
+        task_path = os.path.join(self.task_path, "tiny")
+        os.makedirs(task_path)
+        save_tiny_model(task_path)
+        device = paddle.get_device()
+        paddle.set_device("gpu")
+        try:
+            for batch_size in [1, 2]:
+                task = LacTask(
+                    task="lexical_analysis",
+                    model="lac",
+                    task_path=task_path,
+                    emb_dim=8,
+                    hidden_size=8,
+                    use_tensorrt=True,
+                    batch_size=batch_size,
+                    device_id=0,
+                )
+                shape_range_info_path = os.path.join(
+                    task_path, "static", "_opt_cache", "batch_size_{}".format(batch_size), "shape_range_info.pbtxt"
+                )
+                self.assertTrue(os.path.exists(shape_range_info_path))
+                check_lac_results(self, task, ["天安门", "我爱北京天安门，长江大桥", "A"] * 3)
+        finally:
+            paddle.set_device(device)
+
+
+if __name__ == "__main__":
+    unittest.main()